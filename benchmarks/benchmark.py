@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+import glob
+import random
+import logging
+import argparse
+import platform
+import tracemalloc
+from time import perf_counter
+import numpy as np
+from src.utils.chords_loader import chords_loader
+from src.utils.song_loader import read_song_file
+from src.utils.centroids import centroid_table
+
+from src.algorithms.dynamic import dynamic_stage, trace_path
+from src.algorithms.greedy import greedy_stage, beam_stage
+from src.algorithms.bruteforce import brute_force_displacement
+
+ALGORITHMS = ['dynamic', 'greedy', 'bruteforce', 'beam']
+SONGS_PATH = os.path.join("src", "lib", "songs")
+SYNTHETIC_SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+PERCENTILES = [50, 90, 99]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dynamic, greedy and brute force solvers.")
+    parser.add_argument('--algorithms', nargs='+', choices=ALGORITHMS, default=ALGORITHMS)
+    parser.add_argument('--sizes', nargs='*', type=int, default=SYNTHETIC_SIZES,
+                        help="Lengths of the synthetic songs, none to only run the bundled songs.")
+    parser.add_argument('--warmup', type=int, default=1, help="Untimed runs before measuring each case.")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per case.")
+    parser.add_argument('--bruteforce-max', type=int, default=10 ** 3,
+                        help="Skip brute force on songs longer than this.")
+    parser.add_argument('--beam-width', type=int, default=2, help="Paths kept per chord by the beam search.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the synthetic songs.")
+    parser.add_argument('--output', default="bench_results.json", help="Result file to write.")
+    parser.add_argument('--compare', help="Previous result file to compare median latencies against.")
+    return parser.parse_args(argv)
+
+def bundled_songs(chords_df):
+    # Song_{5,10,15,20}.txt excerpts and full songs, named after their file
+    songs = {}
+    for song_file in sorted(glob.glob(os.path.join(SONGS_PATH, "*.txt"))):
+        name = os.path.splitext(os.path.basename(song_file))[0]
+        songs[name] = [chord for chord in read_song_file(song_file) if chord in chords_df.index]
+    return songs
+
+def synthetic_songs(songs, sizes, seed):
+    # Random songs drawn from the chords of the bundled songs, so transitions stay realistic
+    vocabulary = sorted({chord for song in songs.values() for chord in song})
+    generator = random.Random(seed)
+    return {f"synthetic_{size}": generator.choices(vocabulary, k=size) for size in sizes}
+
+def run(name, song, chords_df, beam_width=2):
+    # Returns the total displacement of the path found by the algorithm
+    if name == 'dynamic':
+        chosen_row, F, G = dynamic_stage(song, chords_df)
+        return float(trace_path(song, F, G, chosen_row)[-1][2])
+    if name == 'greedy':
+        return float(greedy_stage(song, chords_df)[-1][2])
+    if name == 'beam':
+        return float(beam_stage(song, chords_df, beam_width)[-1][2])
+    return float(brute_force_displacement(song, chords_df)[0])
+
+def measure(name, song, chords_df, warmup, repeat, beam_width=2):
+    for _ in range(warmup):
+        run(name, song, chords_df, beam_width)
+
+    timings = []
+    for _ in range(repeat):
+        start_time = perf_counter()
+        cost = run(name, song, chords_df, beam_width)
+        timings.append((perf_counter() - start_time) * 1000)
+
+    # Peak memory is taken on a separate run because tracing slows everything down
+    tracemalloc.start()
+    run(name, song, chords_df, beam_width)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = {
+        'cost': cost,
+        'mean_ms': float(np.mean(timings)),
+        'min_ms': float(np.min(timings)),
+        'peak_memory_bytes': peak_memory,
+    }
+    for percentile, value in zip(PERCENTILES, np.percentile(timings, PERCENTILES)):
+        result[f'p{percentile}_ms'] = float(value)
+    return result
+
+def benchmark(args, chords_df):
+    songs = bundled_songs(chords_df)
+    songs.update(synthetic_songs(songs, args.sizes, args.seed))
+
+    cases = {}
+    for song_name, song in songs.items():
+        case = {'chords': len(song)}
+        for name in args.algorithms:
+            if name == 'bruteforce' and len(song) > args.bruteforce_max:
+                continue
+            case[name] = measure(name, song, chords_df, args.warmup, args.repeat, args.beam_width)
+            print(f"{song_name:<28} {name:<11} {len(song):>8} chords  p50 {case[name]['p50_ms']:>10.3f} ms", file=sys.stderr)
+
+        # How much worse greedy and beam search are than the optimum from dynamic programming
+        for name in ('greedy', 'beam'):
+            if name in case and 'dynamic' in case:
+                optimum = case['dynamic']['cost']
+                case[name]['gap'] = case[name]['cost'] - optimum
+                case[name]['relative_gap'] = case[name]['gap'] / optimum if optimum else 0.0
+        cases[song_name] = case
+    return cases
+
+def compare(cases, previous_file):
+    # Print median latency ratios against a previous result file, > 1 means slower now
+    with open(previous_file, 'r') as file:
+        previous = json.load(file)['cases']
+    for song_name, case in cases.items():
+        for name in ALGORITHMS:
+            if name in case and name in previous.get(song_name, {}):
+                ratio = case[name]['p50_ms'] / previous[song_name][name]['p50_ms']
+                print(f"{song_name:<28} {name:<11} p50 x{ratio:.2f}", file=sys.stderr)
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    chords_df = chords_loader()
+    centroid_table(chords_df)  # Build the shared centroid table outside of the timings
+    cases = benchmark(args, chords_df)
+
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+        },
+        'settings': {
+            'warmup': args.warmup,
+            'repeat': args.repeat,
+            'beam_width': args.beam_width,
+            'seed': args.seed,
+        },
+        'cases': cases,
+    }
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+    if args.compare:
+        compare(cases, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -1,101 +1,195 @@
+import os
+import sys
+import json
 import time
+import logging
+import argparse
+from contextlib import nullcontext
 from src.utils.logger import logger
-from src.utils.chords_loader import chords_loader
-from src.utils.song_loader import song_loader
+from src.utils.chords_loader import chord_store
+from src.utils.profiler import profiler, cprofile
+from src.utils.transitions import transition_cache
+from src.utils.song_loader import song_loader, read_song_file
 
 from src.algorithms.dynamic import dynamic_stage, trace_path, print_results
 from src.algorithms.bruteforce import brute_force_displacement, display_results
-from src.algorithms.greedy import greedy_stage, print_greedy_results
-number_of_chords = 15
-
-logger.announcement("Welcome to the Polynizer Extension! We have compiled a list of four songs that take full advantage of our newly implemented algorithms.", 'info')
-while True:
-    logger.announcement("\nAvailable songs:", 'info_ns')
-    logger.announcement("1. Halsey", 'info_ns')
-    logger.announcement("2. Metallica", 'info_ns')
-    logger.announcement("3. Catch the Rainbow", 'info_ns')
-    logger.announcement("4. Luis Miguel", 'info_ns')
-
-    logger.announcement("Select a song (1-4): ", 'info_ns')
-    choice = input()
-    
-    if choice == '1':
-        song_name = "Halsey"
-        break
-    elif choice == '2':
-        song_name = "Metallica"
-        break
-    elif choice == '3':
-        song_name = "Catch the Rainbow"
-        break
-    elif choice == '4':
-        song_name = "Luis Miguel"
-        break
+from src.algorithms.greedy import greedy_stage, beam_stage, beam_gap, print_greedy_results
+
+ALGORITHMS = ['dynamic', 'greedy', 'bruteforce', 'beam']
+# Meaning of the third value of each path entry, per algorithm
+PATH_VALUES = {'dynamic': 'cost', 'greedy': 'cost', 'bruteforce': 'centroid', 'beam': 'cost'}
+# Lengths bundled songs are available in, 0 being the whole song
+BUNDLED_CHORDS = (0, 5, 10, 15, 20)
+# Algorithms reading the transition cache, the others compute their costs in the solver core
+CACHED_ALGORITHMS = {'bruteforce'}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Find the fingering path with the least hand displacement for a song.")
+    parser.add_argument('--song',
+                        help="Name of a bundled song in src/lib/songs (e.g. Halsey) or path to a song file with one chord per line.")
+    parser.add_argument('--chords', type=int, default=0,
+                        help="Number of chords to use, 0 for all. Bundled songs only provide 5, 10, 15 and 20.")
+    parser.add_argument('--algorithms', nargs='+', choices=ALGORITHMS, default=ALGORITHMS[:3],
+                        help="Algorithms to run, in order (default: dynamic, greedy and bruteforce).")
+    parser.add_argument('--beam-width', type=int, default=2,
+                        help="Paths kept per chord by the beam search, reported with its cost gap to the optimum.")
+    parser.add_argument('--json', action='store_true',
+                        help="Print paths, costs and timings as JSON instead of the result tables.")
+    parser.add_argument('--quiet', action='store_true',
+                        help="Only log warnings and errors, and print the result tables as plain text in one write.")
+    parser.add_argument('--output',
+                        help="Write the result tables as plain text to this file instead of logging them.")
+    parser.add_argument('--verify', action='store_true',
+                        help="Check the dynamic programming costs of every song in src/lib/songs/sources/csv against its CSV and exit.")
+    parser.add_argument('--metrics',
+                        help="Write per-stage timings and counters to this file, as Prometheus text for .prom files and JSON otherwise.")
+    parser.add_argument('--cprofile',
+                        help="Run under cProfile and dump the stats to this file.")
+    args = parser.parse_args(argv)
+    if args.song is None and not args.verify:
+        parser.error("--song is required unless --verify is given.")
+    if args.chords < 0:
+        parser.error("--chords must be 0 or a positive number.")
+    if args.song is not None and not os.path.isfile(args.song) and args.chords not in BUNDLED_CHORDS:
+        parser.error("--chords must be 0, 5, 10, 15 or 20 for bundled songs.")
+    if args.beam_width < 1:
+        parser.error("--beam-width must be at least 1.")
+    return args
+
+def load_song(chords_df, song, number_of_chords, verify=False):
+    # Song files given by path are read as is and have no CSV to verify against
+    if os.path.isfile(song):
+        with profiler.stage('song_loader'):
+            chords = [chord for chord in read_song_file(song) if chord in chords_df.index]
+            if number_of_chords:
+                chords = chords[:number_of_chords]
+            if not chords:
+                logger.error("No valid chords found in the song!")
+                raise Exception("No valid chords found in the song!")
+        profiler.count('songs')
+        profiler.count('chords', len(chords))
+        return chords, None
+    return song_loader(chords_df, number_of_chords, song, verify)
+
+def run_algorithm(name, song, chords_df, beam_width=2):
+    # Returns (path, cost) with path as (chord, variant, value) tuples, see PATH_VALUES
+    if name == 'dynamic':
+        chosen_row, F, G = dynamic_stage(song, chords_df)
+        path = trace_path(song, F, G, chosen_row)
+        return path, path[-1][2]
+    if name == 'greedy':
+        path = greedy_stage(song, chords_df)
+        return path, path[-1][2]
+    if name == 'beam':
+        path = beam_stage(song, chords_df, beam_width)
+        return path, path[-1][2]
+    minimum_displacement, best_path = brute_force_displacement(song, chords_df)
+    return best_path, minimum_displacement
+
+def display(name, path, cost, chords_df, song_df, output=None):
+    if output is not None:
+        output.write(f"\n{name.capitalize()} results\n")
+    if name == 'dynamic':
+        print_results(path, chords_df, song_df, output)
+    elif name == 'greedy':
+        print_greedy_results(path, chords_df, song_df, output)
+    elif name == 'beam':
+        print_greedy_results(path, chords_df, song_df, output, title="Displaying results for beam search:")
     else:
-        logger.announcement("Invalid choice. Please select 1, 2, 3, or 4.", 'error')
-
-while True:
-    logger.announcement("Enter the number of chords to use (0-20, multiples of 5, 0 for all): ", 'info_ns')
-    number_of_chords = input()
-    if number_of_chords.isdigit():
-        number_of_chords = int(number_of_chords)
-        if number_of_chords in range(0, 21, 5):  # Check if it's a multiple of 5 within the range
-            break
-        else:
-            logger.announcement("Invalid input. Please enter a number that is a multiple of 5 between 0 and 20.", 'error')
+        display_results(cost, path, song_df, output)
+
+def record_cache_stats(chords_df, algorithms):
+    # Cache counters are kept by the caches themselves, copy them into the profiler once.
+    # The transition cache counters are left out when no algorithm that reads it ran.
+    if CACHED_ALGORITHMS.intersection(algorithms):
+        info = transition_cache(chords_df).cache_info()
+        profiler.count('transition_cache_hits', info.hits)
+        profiler.count('transition_cache_misses', info.misses)
+    if hasattr(chords_df, 'materialized'):
+        profiler.count('chords_materialized', chords_df.materialized())
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.json:
+        logging.disable(logging.CRITICAL)
+    if args.quiet:
+        logger.set_level(logging.WARNING)
+    if args.metrics:
+        profiler.enable()
+
+    # Result tables are written in bulk to a file, or to stdout in quiet mode
+    if args.output:
+        output = open(args.output, 'w')
     else:
-        logger.announcement("Invalid input. Please enter a positive integer.", 'error')
-
-while True:
-    logger.announcement("Do you want to run the greedy algorithm? (y/n): ", 'info_ns')
-    choice = input()
-    if choice == 'y':
-        run_greedy = True
-        break
-    elif choice == 'n':
-        run_greedy = False
-        break
-
-if number_of_chords == 0:
-    logger.announcement(f"Running algorithms for song {song_name} using all chords...", 'info')
-else:
-    logger.announcement(f"Running algorithms for song {song_name} using {number_of_chords} chords...", 'info')
-time.sleep(2)
-
-# Load necessary data
-logger.announcement("Loading song and chord data...", 'info')
-chords_df = chords_loader()
-song, song_df = song_loader(chords_df, number_of_chords, song_name)
-logger.announcement("Song and chord data loaded successfully.", 'success')
-time.sleep(2)
-# Run and measure time it takes to run dynamic programming
-logger.announcement("Running dynamic programming...", 'info')
-start_time = time.time()
-chosen_row, F, G = dynamic_stage(song, chords_df)
-path = trace_path(song, F, G, chosen_row)
-end_time = time.time()
-logger.announcement(f"Dynamic programming completed in {(end_time - start_time) * 1000:.2f} ms.", 'success')
-
-logger.announcement("Displaying results for dynamic programming...", 'info')
-print_results(path, chords_df, song_df)
-time.sleep(2)
-
-# Run and measure time it takes to run brute force
-logger.announcement(f"Running brute force algorithm.", 'info')
-start_time = time.time()
-minimum_displacement, best_path = brute_force_displacement(song, chords_df)
-end_time = time.time()
-logger.announcement(f"Brute force completed in {(end_time - start_time) * 1000:.2f} ms.", 'success')
-
-# Display results
-logger.announcement("Displaying results for brute force...", 'info')
-display_results(minimum_displacement, best_path, song_df)
-time.sleep(2)
-
-start_time = time.time()
-path = greedy_stage(song, chords_df)
-end_time = time.time()
-
-elapsed_time = end_time - start_time
-logger.info(f"Greedy algorithm completed in {elapsed_time * 1000:.2f} ms.")
-print_greedy_results(path, chords_df, song_df)
\ No newline at end of file
+        output = sys.stdout if args.quiet else None
+    try:
+        with cprofile(args.cprofile) if args.cprofile else nullcontext():
+            if args.verify:
+                failed = verify(output or sys.stdout)
+            else:
+                run(args, output)
+    except FileNotFoundError:
+        sys.exit(f"Song not found: {args.song}. Give the name of a bundled song in src/lib/songs or a path to a song file.")
+    finally:
+        if args.output:
+            output.close()
+
+    if args.metrics:
+        profiler.write(args.metrics)
+    if args.verify and failed:
+        sys.exit(1)
+
+def verify(output):
+    # CI-style check of every exported song, returns the number of songs that do not match.
+    # The batch module brings in multiprocessing, so it is only imported for this mode
+    from src.algorithms.batch import verify_songs
+    reports = verify_songs()
+    lines = []
+    for report in reports:
+        lines.append(f"{'OK' if report.ok else 'FAIL'} {report.song}: {report.checked} positions checked "
+                     f"against '{report.column}', max diff {report.max_diff:.2f}")
+        lines += [f"    position {mismatch.position} ({mismatch.chord}): expected {mismatch.expected:.2f}, "
+                  f"got {mismatch.computed:.2f}" for mismatch in report.mismatches]
+    logger.table("CSV verification:", lines, output)
+    return sum(not report.ok for report in reports)
+
+def run(args, output=None):
+    # Load necessary data
+    logger.announcement("Loading song and chord data...", 'info')
+    chords_df = chord_store()
+    # The expected results are only needed for the result tables
+    song, song_df = load_song(chords_df, args.song, args.chords, verify=not args.json)
+    logger.announcement("Song and chord data loaded successfully.", 'success')
+
+    results = {}
+    for name in args.algorithms:
+        # Run and measure time it takes to run each algorithm
+        logger.announcement(f"Running {name} algorithm...", 'info')
+        start_time = time.perf_counter()
+        path, cost = run_algorithm(name, song, chords_df, args.beam_width)
+        elapsed_time = time.perf_counter() - start_time
+        logger.announcement(f"{name.capitalize()} algorithm completed in {elapsed_time * 1000:.2f} ms.", 'success')
+
+        results[name] = {
+            'cost': float(cost),
+            'time_ms': elapsed_time * 1000,
+            'path': [{'chord': chord, 'variant': int(variant), PATH_VALUES[name]: float(value)} for chord, variant, value in path],
+        }
+        if not args.json:
+            logger.announcement(f"Displaying results for {name}...", 'info')
+            display(name, path, cost, chords_df, song_df, output)
+
+    if 'beam' in results:
+        # Report how far the beam search is from the optimum, solving it exactly if needed
+        gap = beam_gap(song, chords_df, args.beam_width, results['beam']['cost'], results.get('dynamic', {}).get('cost'))
+        results['beam'].update({'width': gap.width, 'gap': gap.gap, 'relative_gap': gap.relative_gap})
+        logger.announcement(f"Beam search (width {gap.width}) costs {gap.gap:.4f} more than the optimum "
+                            f"({gap.relative_gap:.2%}).", 'success')
+    record_cache_stats(chords_df, args.algorithms)
+
+    if args.json:
+        json.dump({'song': args.song, 'chords': song, 'results': results}, sys.stdout)
+        sys.stdout.write("\n")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from src.utils.logger import logger
+from src.utils.chords_loader import chord_store
+from src.utils.song_loader import SONGS_PATH, CSV_PATH, song_files, load_songs
+from src.utils.verification import verify_costs
+from src.utils.centroids import centroid_table
+from src.algorithms.dynamic import dynamic_stage, dynamic_stage_many, trace_path
+
+# Centroid table of the current worker process, set once by init_worker
+worker_table = None
+
+def init_worker(table):
+    global worker_table
+    worker_table = table
+
+def solve_song(song, table=None):
+    # Solve one song given as a list of known chords, returning (path, cost) with plain tuples
+    table = table if table is not None else worker_table
+    chosen_row, F, G = dynamic_stage(song, table)
+    path = [(chord, int(variant), float(cost)) for chord, variant, cost in trace_path(song, F, G, chosen_row)]
+    return path, path[-1][2]
+
+def solve_chunk(files, table=None):
+    # Solve a chunk of song files with the dynamic programming engine, in file order
+    table = table if table is not None else worker_table
+
+    songs = load_songs(files, table).indices
+    for song_file, song in zip(files, songs):
+        if not song.size:
+            logger.warning(f"No valid chords found in {song_file}")
+
+    results = [([], float('inf'))] * len(files)
+    solvable = [row for row, song in enumerate(songs) if song.size]
+    if solvable:
+        solved = dynamic_stage_many([songs[row] for row in solvable], table)
+        for row, (chosen_row, F, G) in zip(solvable, solved):
+            song = [table.names[chord] for chord in songs[row].tolist()]
+            path = [(chord, int(variant), float(cost)) for chord, variant, cost in trace_path(song, F, G, chosen_row)]
+            results[row] = (path, path[-1][2])
+    return results
+
+def solve_songs(songs, workers=None, chords_df=None, chunk_size=None):
+    # Optimize many songs in one call. The chord dictionary is opened once and handed to
+    # every worker when the pool starts. By default it is a lazy ChordStore, which workers
+    # reopen from the memory-mapped cache instead of receiving a copy. Returns
+    # (song_file, path, cost) tuples in input order, with an empty path and infinite cost
+    # for songs without valid chords.
+    files = song_files(songs)
+    table = centroid_table(chords_df if chords_df is not None else chord_store())
+    if not files:
+        return []
+
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(files))
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(files) // (workers * 4)))  # A few chunks per worker to balance load
+    chunks = [files[start:start + chunk_size] for start in range(0, len(files), chunk_size)]
+
+    logger.info(f"Solving {len(files)} songs with {workers} workers...")
+    if workers == 1:
+        solved = [solve_chunk(chunk, table) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(table,)) as executor:
+            solved = list(executor.map(solve_chunk, chunks))
+
+    results = []
+    for chunk, chunk_results in zip(chunks, solved):
+        for song_file, (path, cost) in zip(chunk, chunk_results):
+            results.append((song_file, path, cost))
+    logger.success(f"Solved {len(results)} songs.")
+    return results
+
+def verification_songs(csv_dir):
+    # Pair every exported CSV with its song file, the bundled song first, then the plain text source
+    pairs = []
+    for csv_name in sorted(name for name in os.listdir(csv_dir) if name.endswith('.csv')):
+        song_name = csv_name[:-len('.csv')]
+        for song_dir in (SONGS_PATH, os.path.join(SONGS_PATH, "sources", "txt")):
+            song_file = os.path.join(song_dir, f"{song_name}.txt")
+            if os.path.isfile(song_file):
+                pairs.append((song_file, os.path.join(csv_dir, csv_name)))
+                break
+        else:
+            logger.warning(f"No song file found for {csv_name}")
+    return pairs
+
+def verify_songs(csv_dir=CSV_PATH, workers=None, chords_df=None):
+    # Solve every song with an exported CSV and check the dynamic programming costs against
+    # it. Returns one VerificationReport per song, in CSV file name order.
+    import pandas as pd
+    pairs = verification_songs(csv_dir)
+    solved = solve_songs([song_file for song_file, _ in pairs], workers=workers, chords_df=chords_df)
+
+    reports = []
+    for (song_file, csv_file), (_, path, _) in zip(pairs, solved):
+        chords = [chord for chord, _, _ in path]
+        costs = [cost for _, _, cost in path]
+        reports.append(verify_costs(chords, costs, pd.read_csv(csv_file), song=song_file))
+
+    failed = [report for report in reports if not report.ok]
+    if failed:
+        logger.error(f"{len(failed)} of {len(reports)} songs do not match their CSV: {', '.join(report.song for report in failed)}")
+    else:
+        logger.success(f"All {len(reports)} songs match their CSV.")
+    return reports
@@ -1,122 +1,136 @@
-from typing import List, Tuple
+import sys
+from typing import TYPE_CHECKING, Dict, List, TextIO, Tuple
 import math
-import pandas as pd
 from src.utils.logger import logger
-
-# The get_centroids function calculates average positions for a chord’s 
-# 3 possible variants. These centroids represent the average positions of the fretboard and 
-# string placements required to play each variant of the chord.
-def get_centroids(chord: str, df: pd.DataFrame) -> List[float]:
-
-    invalid = [-1, -1, -1, -1, -1]  # Placeholder for invalid variant indicators on the data
-    placements = df.loc[chord].values.tolist()  # Fetch chord data from DataFrame
-    placements = [-1.0 if math.isnan(x) else x for x in placements]  # Handle NaN values
-    centroids = []  # List to store computed centroids for each variant
-
-    # Compute centroids for each variant
-    for i in range(0, 20, 7):  # The range (0, 20, 7) divides the chord data into three groups of 7 columns:i = 0 corresponds to the first variant.i = 7 corresponds to the second variant.i = 14 corresponds to the third variant.
-        if placements[i] == -1:  # Non-existent variant
-            fret = 0
-        else:
-            fret = placements[i] - 1  # Adjust fret number for calculations
-
-        total_sum = 0  # Sum of fret positions and finger placements
-        divisor = 6  # assumns all six strings are played. If not -1
-        if placements[i] > 7:  # Invalid fret (outside playable range)
-            centroids.append(10000.0)  # Mark as invalid
-        else:
-            for x in range(i + 1, i + 7):  # Process string placements
-                if placements[x] == -1: 
-                    divisor -= 1
-                else:
-                    total_sum += fret + placements[x]
-            centroids.append(total_sum / divisor if divisor != 0 else 0)  # Avoid division by zero
-
-    # Mark second and third variants as invalid if missing data, project instrution
-    if placements[8:13] == invalid:
-        centroids[1] = 10000.0
-    if placements[15:20] == invalid:
-        centroids[2] = 10000.0
-
-    return centroids 
-
-# Brute force logic to find the minimum displacement path
-def brute_force_displacement(song: List[str], df: pd.DataFrame) -> Tuple[float, List[Tuple[str, int, float]]]:
+from src.utils.profiler import timed
+from src.utils.centroids import INVALID, centroid_table
+from src.utils.transitions import transition_cache
+from src.utils.verification import verification_marks
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Exhaustive search for the minimum displacement path. Every variant sequence is still
+# considered, but branches that cannot beat the best cost found so far are pruned and the
+# best completion from (idx, prev_variant) is memoized, so the search is linear in practice.
+@timed('brute_force_displacement')
+def brute_force_displacement(song: List[str], df: 'pd.DataFrame') -> Tuple[float, List[Tuple[str, int, float]]]:
     
     # Precompute centroids for all chords in the song
     logger.info("Precomputing centroids for all chords.")
-    centroids = {chord: get_centroids(chord, df) for chord in song}
+    table = centroid_table(df)
+    centroids = {chord: table.get(chord) for chord in song}
     logger.info("Centroids precomputed for all chords.")
 
-    minimum_displacement = float('inf')  # Initialize minimum displacement
-    best_path = []  # Initialize optimal path
+    # Transition matrices come from the cache shared with the other algorithms
+    transitions = transition_cache(df)
+    first_costs = [0.0 if centroid != INVALID else float('inf') for centroid in centroids[song[0]]] if song else []
 
-    # Recursive helper function to explore all possible paths
-    def explore(idx: int, current_path: List[Tuple[str, int, float]], cumulative_cost: float):
-        
-        nonlocal minimum_displacement, best_path #(keep track of the minimum displacement and the corresponding path)
+    # (idx, prev_variant) -> (cost, exact, best_variant). When exact is False, cost is only
+    # a lower bound for completing the song because the search was cut by the budget.
+    memo: Dict[Tuple[int, int], Tuple[float, bool, int]] = {}
 
+    # Recursive helper returning (cost, exact) for the cheapest way to play song[idx:]
+    # after playing the previous chord with prev_variant. The cost is exact when it is
+    # below budget, otherwise it is a lower bound that is at least the budget.
+    def explore(idx: int, prev_variant: int, budget: float) -> Tuple[float, bool]:
         if idx == len(song):  # Base case: all chords have been processed
-            if cumulative_cost < minimum_displacement:  # Update minimum if a better path is found
-                minimum_displacement = cumulative_cost
-                best_path = current_path[:]
-            return
+            return 0.0, True
+
+        key = (idx, prev_variant)
+        if key in memo:
+            cost, exact, _ = memo[key]
+            if exact or cost >= budget:
+                return cost, exact
+
+        best_cost = float('inf')  # Best exact completion found so far
+        best_variant = -1
+        lower_bound = float('inf')  # Lower bound over every variant, pruned or not
+
+        # Transition costs from the previous centroid, infinite for invalid variants
+        if idx > 0:
+            transition_costs = transitions.matrix(song[idx - 1], song[idx])[prev_variant]
+        else:
+            transition_costs = first_costs  # No cost for the first chord
 
-        current_chord = song[idx]  # Current chord being processed
         for variant in range(3):  # Explore all three variants for the current chord
-            current_centroid = centroids[current_chord][variant]  # Get centroid for variant
-            if current_centroid == 10000.0:  # Skip invalid variants
+            transition_cost = transition_costs[variant]
+            if transition_cost == float('inf'):  # Skip invalid variants
+                continue
+
+            # Prune branches that are already as expensive as the best known path
+            limit = min(budget, best_cost)
+            if transition_cost >= limit:
+                lower_bound = min(lower_bound, transition_cost)
                 continue
 
-            # Calculate transition cost from previous centroid
-            if idx > 0: #retrieve the centroid of the previous chord and calculate the transition cost
-                prev_centroid = current_path[-1][2]  # Last centroid in the path
-                transition_cost = (current_centroid - prev_centroid) ** 2
-            else:
-                transition_cost = 0  # No cost for the first chord
-
-            # Recurse to the next chord
-            explore(
-                idx + 1,
-                current_path + [(current_chord, variant, current_centroid)],  # Append current choice to path
-                cumulative_cost + transition_cost,  # Update cumulative cost
-            )
-
-    # Start recursive exploration from the first chord
-    explore(0, [], 0.0)
+            rest_cost, exact = explore(idx + 1, variant, limit - transition_cost)
+            total_cost = transition_cost + rest_cost
+            lower_bound = min(lower_bound, total_cost)
+            if exact and total_cost < best_cost:
+                best_cost = total_cost
+                best_variant = variant
+
+        if best_cost < budget:
+            memo[key] = (best_cost, True, best_variant)
+            return best_cost, True
+        memo[key] = (lower_bound, False, -1)
+        return lower_bound, False
+
+    # Start the search from the first chord, deep songs need a deeper recursion limit
+    recursion_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(recursion_limit, len(song) + 100))
+    try:
+        explore(0, -1, float('inf'))
+    finally:
+        sys.setrecursionlimit(recursion_limit)
+
+    # Follow the memoized choices and add up the displacement along the optimal path
+    minimum_displacement = float('inf') if song else 0.0  # An empty song costs nothing
+    best_path = []
+    variant = memo.get((0, -1), (0.0, False, -1))[2]
+    if variant != -1:
+        minimum_displacement = 0.0
+        for idx, chord in enumerate(song):
+            current_centroid = centroids[chord][variant]
+            if idx > 0:
+                minimum_displacement += (current_centroid - best_path[-1][2]) ** 2
+            best_path.append((chord, variant, current_centroid))
+            if idx + 1 < len(song):
+                variant = memo[(idx + 1, variant)][2]
+
     return minimum_displacement, best_path  # Return the minimum displacement and corresponding path
 
 # Function to display results in a readable format
-def display_results(minimum_displacement: float, best_path: List[Tuple[str, int, float]], csv_data: pd.DataFrame = None):
-    logger.announcement("Run statistics:", 'info')
-    logger.info(f"Minimum displacement: {minimum_displacement}")
-    logger.info(f"Sqrt(total cost): {math.sqrt(minimum_displacement):.2f}")
-    logger.announcement("Optimal Path:", 'info')
+@timed('display_results')
+def display_results(minimum_displacement: float, best_path: List[Tuple[str, int, float]], csv_data: 'pd.DataFrame' = None, output: TextIO = None):
+    # Without an output stream the table goes to the logger, skip it when nobody listens
+    if output is None and not logger.enabled():
+        return
+    if output is not None:
+        output.write(f"Run statistics:\nMinimum displacement: {minimum_displacement}\n"
+                     f"Sqrt(total cost): {math.sqrt(minimum_displacement):.2f}\n")
+    else:
+        logger.announcement("Run statistics:", 'info')
+        logger.info(f"Minimum displacement: {minimum_displacement}")
+        logger.info(f"Sqrt(total cost): {math.sqrt(minimum_displacement):.2f}")
     
-    cumulative_cost = 0
-    for i, (chord, variant, centroid) in enumerate(best_path):
+    cumulative_costs = []
+    for i in range(len(best_path)):
         if i == 0:
             cumulative_cost = 0
         else:
             cumulative_cost += (best_path[i][2] - best_path[i - 1][2]) ** 2
-        sqrt_cost = math.sqrt(cumulative_cost)
-        
-        # Verify against CSV data if provided
-        csv_verification = ""
-        if csv_data is not None and i < len(csv_data):
-            try:
-                expected_l2 = csv_data.iloc[i]['L2 distance']
-            except:
-                expected_l2 = csv_data.iloc[i]['Sqrt(total cost)']
-
-            diff = abs(sqrt_cost - expected_l2)
-            if diff < 0.1:  # Allow small floating-point differences
-                csv_verification = f"✓ (CSV: {expected_l2:.2f})"
-            else:
-                csv_verification = f"❌ (CSV: {expected_l2:.2f}, diff: {diff:.2f})"
-        
-        logger.announcement(
+        cumulative_costs.append(cumulative_cost)
+    # Verify against CSV data if provided
+    marks = verification_marks(cumulative_costs, csv_data)
+
+    lines = []
+    for i, (chord, variant, centroid) in enumerate(best_path):
+        sqrt_cost = math.sqrt(cumulative_costs[i])
+        lines.append(
             f"For {chord} play variant {variant}. "
-            f"Centroid: {centroid:.2f}, Total cost: {sqrt_cost:.2f} {csv_verification}", 
-            'info_ns'
+            f"Centroid: {centroid:.2f}, Total cost: {sqrt_cost:.2f} {marks[i]}"
         )
+
+    logger.table("Optimal Path:", lines, output)
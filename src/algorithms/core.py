@@ -0,0 +1,224 @@
+import numpy as np
+
+# Number of transition costs evaluated in one vectorized call, about 32 MB of float64.
+# Bounds the memory of the (steps, V, V) cost blocks on long songs with many variants.
+BLOCK_SIZE = 1 << 22
+
+def squared_distance(prev, curr):
+    # Default cost: squared difference of the variant features, summed over any trailing
+    # feature axis. prev has shape (steps, V, 1, ...) and curr (steps, 1, V, ...).
+    costs = (prev - curr) ** 2
+    if costs.ndim > 3:
+        costs = costs.sum(axis=tuple(range(3, costs.ndim)))
+    return costs
+
+def pad_variants(chords, fill=np.nan):
+    # Ragged per-chord variant features, e.g. one array of centroids per chord, to a
+    # (n, V, ...) array padded with fill plus the number of variants of every chord
+    counts = np.array([len(chord) for chord in chords], dtype=np.intp)
+    first = np.asarray(chords[0], dtype=np.float64)
+    features = np.full((len(chords), counts.max()) + first.shape[1:], fill)
+    for idx, chord in enumerate(chords):
+        features[idx, :counts[idx]] = chord
+    return features, counts
+
+def variant_mask(features, counts=None, valid=None):
+    # Playable variants: the given mask, restricted to the first counts[idx] slots of each chord
+    n, V = features.shape[:2]
+    mask = np.ones((n, V), dtype=bool) if valid is None else np.array(valid, dtype=bool)
+    if counts is not None:
+        mask &= np.arange(V) < np.asarray(counts)[:, None]
+    return mask
+
+def step_costs(features, valid, cost, start, stop):
+    # costs[k, j, i] goes from variant j of chord start + k to variant i of chord start + k + 1.
+    # Moving to an unplayable variant costs inf, moving from one keeps the cost function's value.
+    prev = features[start:stop, :, None]
+    curr = features[start + 1:stop + 1, None, :]
+    with np.errstate(invalid='ignore', over='ignore'):
+        costs = np.asarray(cost(prev, curr), dtype=np.float64)
+    return np.where(valid[start + 1:stop + 1, None, :] & ~np.isnan(costs), costs, np.inf)
+
+def block_costs(features, valid, cost):
+    # Yield (start, costs) blocks covering every transition of the song in order
+    V = valid.shape[1]
+    block = max(1, BLOCK_SIZE // (V * V))
+    for start in range(0, len(features) - 1, block):
+        yield start, step_costs(features, valid, cost, start, min(start + block, len(features) - 1))
+
+def song_costs(features, cost=squared_distance, counts=None, valid=None):
+    # Every transition cost of a song at once, (n - 1, V, V), see step_costs
+    features = np.asarray(features, dtype=np.float64)
+    return step_costs(features, variant_mask(features, counts, valid), cost, 0, len(features) - 1)
+
+def backpointer_type(V):
+    return np.int8 if V <= 127 else np.int16
+
+def solve_dynamic(features, cost=squared_distance, counts=None, valid=None, start_costs=None):
+    # Exact Viterbi over any number of variants per chord, O(n * V^2). features has shape
+    # (n, V) or (n, V, ...), see pad_variants for ragged chords. Returns (chosen_row, F, G),
+    # F[idx, v] being the cost of the cheapest path ending in variant v of chord idx and
+    # G[idx, v] its previous variant, -1 when no path reaches it. Ties go to the lowest variant.
+    # start_costs seeds F[0], to carry on a solve that stopped at the first chord.
+    features = np.asarray(features, dtype=np.float64)
+    valid = variant_mask(features, counts, valid)
+    n, V = valid.shape
+
+    F = np.empty((n, V))
+    G = np.empty((n, V), dtype=backpointer_type(V))
+    # Unplayable variants of the first chord cannot start a path
+    F[0] = np.where(valid[0], 0.0 if start_costs is None else start_costs, np.inf)
+    G[0] = np.arange(V)  # Start with each variant
+
+    variants = np.arange(V)
+    prev_costs = F[0]
+    for start, costs in block_costs(features, valid, cost):
+        for offset, matrix in enumerate(costs):
+            total = prev_costs[:, None] + matrix
+            best = total.argmin(axis=0)  # First previous variant reaching the minimum
+            idx = start + offset + 1
+            G[idx] = best
+            prev_costs = F[idx] = total[best, variants]
+    G[1:][np.isinf(F[1:])] = -1  # No valid previous variant
+
+    chosen_row = int(F[-1].argmin())  # Find the optimal last variant
+    return chosen_row, F, G
+
+def solve_dynamic_many(features, lengths, cost=squared_distance, valid=None):
+    # solve_dynamic for a batch of songs padded to the same length, features has shape
+    # (songs, n, V) or (songs, n, V, ...) and valid (songs, n, V). Each position is a few
+    # broadcast operations over every song, so the interpreter overhead is paid once per
+    # position instead of once per position and song. Positions past the length of a song
+    # keep its variant for free. Returns F and G of shape (n, songs, V).
+    features = np.asarray(features, dtype=np.float64)
+    songs, n, V = features.shape[:3]
+    valid = np.ones((songs, n, V), dtype=bool) if valid is None else np.asarray(valid, dtype=bool)
+    padding = np.arange(n)[:, None] >= np.asarray(lengths)[None, :]
+    identity = np.where(np.eye(V, dtype=bool), 0.0, np.inf)
+
+    F = np.empty((n, songs, V))
+    G = np.empty((n, songs, V), dtype=backpointer_type(V))
+    F[0] = np.where(valid[:, 0], 0.0, np.inf)  # Unplayable variants of the first chord cannot start a path
+    G[0] = np.arange(V)  # Start with each variant
+
+    for idx in range(1, n):
+        # Same cost call as step_costs, with the songs in place of the steps
+        prev = features[:, idx - 1][:, :, None]
+        curr = features[:, idx][:, None, :]
+        with np.errstate(invalid='ignore', over='ignore'):
+            costs = np.asarray(cost(prev, curr), dtype=np.float64)
+        costs = np.where(valid[:, idx, None, :] & ~np.isnan(costs), costs, np.inf)
+        costs[padding[idx]] = identity
+
+        # Keep the first previous variant reaching the minimum, like solve_dynamic
+        prev_costs = F[idx - 1]
+        min_cost = prev_costs[:, 0, None] + costs[:, 0]
+        best = np.zeros((songs, V), dtype=G.dtype)
+        for j in range(1, V):
+            total = prev_costs[:, j, None] + costs[:, j]
+            best[total < min_cost] = j
+            min_cost = np.minimum(min_cost, total)
+        F[idx] = min_cost
+        G[idx] = best
+    G[1:][np.isinf(F[1:])] = -1  # No valid previous variant
+
+    return F, G
+
+def min_plus(A, B):
+    # Min-plus product of two (V, V) cost matrices, with the argmin over the shared variant
+    total_cost = A[:, :, None] + B[None, :, :]
+    return total_cost.min(axis=1), total_cost.argmin(axis=1)
+
+def transfer_matrix(costs):
+    # Min-plus product of the (steps, V, V) transition costs of a run of chords: matrix[s, e]
+    # is the cheapest way from variant s of its first chord to variant e of its last one.
+    # backpointers[k, s, e] is the variant of chord k on that way, for tracing it back.
+    V = costs.shape[-1]
+    matrix = np.where(np.eye(V, dtype=bool), 0.0, np.inf)
+    backpointers = np.empty((len(costs), V, V), dtype=backpointer_type(V))
+    for idx, step in enumerate(costs):
+        matrix, backpointers[idx] = min_plus(matrix, step)
+    return matrix, backpointers
+
+def solve_greedy(features, cost=squared_distance, counts=None, valid=None, start_variant=0):
+    # Only follows the cheapest transition out of the variant chosen for the previous chord.
+    # It starts on start_variant even when that variant is unplayable, and when no variant of
+    # a chord can be reached it records -1 with an infinite cost and carries on from the last
+    # variant of that chord. Returns the chosen variants and the cumulative cost at every chord.
+    features = np.asarray(features, dtype=np.float64)
+    valid = variant_mask(features, counts, valid)
+    n, V = valid.shape
+    counts = [V] * n if counts is None else list(counts)
+
+    variants = np.empty(n, dtype=backpointer_type(V))
+    costs = np.empty(n)
+    chosen_variant = start_variant
+    cumulative_cost = 0.0
+    variants[0] = chosen_variant
+    costs[0] = cumulative_cost
+
+    for start, block in block_costs(features, valid, cost):
+        for offset, matrix in enumerate(block):
+            idx = start + offset + 1
+            row = matrix[chosen_variant % counts[idx - 1]]
+            best_variant = int(row.argmin())
+            min_cost = float(row[best_variant])
+            if min_cost == float('inf'):
+                best_variant = -1
+            cumulative_cost += min_cost
+            chosen_variant = best_variant
+            variants[idx] = chosen_variant
+            costs[idx] = cumulative_cost
+
+    return variants, costs
+
+def solve_beam(features, width, cost=squared_distance, counts=None, valid=None):
+    # Beam search between solve_greedy, which keeps one variant per chord, and solve_dynamic,
+    # which keeps all of them. Every chord keeps the width cheapest partial paths, each ending
+    # on a different variant, and only those are extended: the cost function is evaluated on
+    # width x V transitions per chord instead of V x V, O(n * width * V). Ties go to the
+    # lowest variant, so width 1 is the greedy walk from the first playable variant (up to
+    # rounding ties) and width >= V finds the optimal cost. Returns the chosen variants and
+    # the cumulative cost at every chord.
+    if width < 1:
+        raise ValueError("width must be at least 1.")
+    features = np.asarray(features, dtype=np.float64)
+    valid = variant_mask(features, counts, valid)
+    n, V = valid.shape
+    width = min(width, V)
+
+    # Variant, cumulative cost and previous beam slot of every beam slot of every chord
+    beam_variants = np.empty((n, width), dtype=np.intp)
+    beam_costs = np.empty((n, width))
+    beam_parents = np.zeros((n, width), dtype=np.intp)
+    start_costs = np.where(valid[0], 0.0, np.inf)
+    keep = np.argsort(start_costs, kind='stable')[:width]
+    beam_variants[0] = keep
+    beam_costs[0] = start_costs[keep]
+
+    variants = np.arange(V)
+    for idx in range(1, n):
+        # Same cost call as step_costs, with the beam in place of the previous chord's variants
+        prev = features[idx - 1, beam_variants[idx - 1]][None, :, None]
+        curr = features[idx][None, None, :]
+        with np.errstate(invalid='ignore', over='ignore'):
+            step = np.asarray(cost(prev, curr), dtype=np.float64)[0]
+        step = np.where(valid[idx] & ~np.isnan(step), step, np.inf)
+
+        total = beam_costs[idx - 1][:, None] + step
+        parents = total.argmin(axis=0)  # Cheapest beam slot to reach every variant from
+        best = total[parents, variants]
+        keep = np.argsort(best, kind='stable')[:width]
+        beam_variants[idx] = keep
+        beam_costs[idx] = best[keep]
+        beam_parents[idx] = parents[keep]
+
+    # Walk back from the cheapest slot of the last chord
+    path_variants = np.empty(n, dtype=backpointer_type(V))
+    path_costs = np.empty(n)
+    slot = int(beam_costs[-1].argmin())
+    for idx in range(n - 1, -1, -1):
+        path_variants[idx] = beam_variants[idx, slot]
+        path_costs[idx] = beam_costs[idx, slot]
+        slot = beam_parents[idx, slot]
+    return path_variants, path_costs
@@ -1,118 +1,126 @@
 import math
+from array import array
+import numpy as np
 from src.utils.logger import logger
+from src.utils.profiler import timed
+from src.utils.centroids import INVALID, centroid_table
+from src.algorithms.core import solve_dynamic, solve_dynamic_many
+from src.utils.verification import verification_marks
 
-def get_centroids(chord, df):
-    invalid = [-1, -1, -1, -1, -1]
-
-    # Get finger positions and deal with NaN values
-    placements = df.loc[chord].values.tolist()
-    placements = [-1.0 if math.isnan(x) else x for x in placements]
-
-    # List to store centroids
-    centroids = []
-
-    for i in range(0, 20, 7):
-        # Check if chord is NaN and fix
-        if placements[i] == -1:
-            fret = 0
-        else:
-            # Fix fret to work with finger values later
-            fret = placements[i] - 1 
-        
-        total_sum = 0
-        divisor = 6
-        # If the chord is invalid, set the centroid to a very large number
-        if placements[i] > 7:  
-            fret = 10000.0
-            centroids.append(fret)
-        else:
-            for x in range(i + 1, i + 7):  # go through chord variant
-                if placements[x] == -1:
-                    divisor -= 1
-                else:
-                    total_sum += (fret + placements[x])
-            if divisor != 0:
-                centroids.append(total_sum / divisor)
-            else:
-                centroids.append(0)
-
-    # Check for non-existent chord placements
-    if placements[8:13] == invalid:
-        centroids[1] = 10000.0
-    if placements[15:20] == invalid:
-        centroids[2] = 10000.0
-
-    return centroids
-
+@timed('dynamic_stage')
 def dynamic_stage(song, df):
-    # Displacement matrix (F) and path matrix (G)
-    F = [[float('inf')] * len(song) for _ in range(3)]
-    G = [[-1] * len(song) for _ in range(3)]
-
-    # Initialize base case
-    for i in range(3):
-        F[i][0] = 0  # Start with zero cost
-        G[i][0] = i  # Start with each variant
-
-    # Fill DP table
-    for idx in range(1, len(song)):
-        prev_centroids = get_centroids(song[idx - 1], df)
-        curr_centroids = get_centroids(song[idx], df)
-
-        for i in range(3):  # Current variants
-            min_cost = float('inf')
-            best_prev_variant = -1
-            for j in range(3):  # Previous variants
-                if prev_centroids[j] >= 10000.0 or curr_centroids[i] >= 10000.0:
-                    continue
-                cost = (prev_centroids[j] - curr_centroids[i]) ** 2
-                total_cost = F[j][idx - 1] + cost
-                if total_cost < min_cost:
-                    min_cost = total_cost
-                    best_prev_variant = j
-            F[i][idx] = min_cost
-            G[i][idx] = best_prev_variant
-
-    # Find the optimal last variant
-    last_costs = [F[i][len(song) - 1] for i in range(3)]
-    chosen_row = last_costs.index(min(last_costs))
-
-    return chosen_row, F, G
+    # Exact solve on the centroids of the song, variants at INVALID cannot be played
+    centroids = centroid_table(df).song_centroids(song)
+    _, F, G = solve_dynamic(centroids, valid=centroids < INVALID)
+    F[0] = 0.0  # The table starts every variant at zero cost, unplayable ones just never lead anywhere
+    chosen_row = int(F[-1].argmin())  # Find the optimal last variant
+
+    # Expose the tables as F[variant][idx] and G[variant][idx] without copying
+    return chosen_row, F.T, G.T
+
+def dynamic_stage_vectorized(song, df):
+    # Same result as dynamic_stage, with F[variant][idx] and G[variant][idx] as NumPy arrays
+    return dynamic_stage_many([song], df)[0]
+
+@timed('dynamic_stage_many')
+def dynamic_stage_many(songs, df):
+    # Solve several songs together, returning (chosen_row, F, G) for each of them.
+    # Songs are chord lists or arrays of chord rows, as returned by load_songs
+    table = centroid_table(df)
+    lengths = np.array([len(song) for song in songs])
+    length = lengths.max()
+
+    # Map every song to chord indices once, padding shorter songs by repeating their last chord
+    indices = np.empty((len(songs), length), dtype=np.intp)
+    for row, song in enumerate(songs):
+        indices[row, :len(song)] = song if isinstance(song, np.ndarray) else table.indices(song)
+        indices[row, len(song):] = indices[row, len(song) - 1]
+
+    # Padding positions keep the variant for free, their tables are cut back below
+    centroids = table.take(indices)
+    F, G = solve_dynamic_many(centroids, lengths, valid=centroids < INVALID)
+    F[0] = 0.0  # Same starting row as dynamic_stage
+
+    results = []
+    for row, song in enumerate(songs):
+        last = len(song) - 1
+        chosen_row = int(F[last, row].argmin())  # Find the optimal last variant
+        results.append((chosen_row, F[:last + 1, row].T, G[:last + 1, row].T))
+    return results
+
+class TracedPath:
+    # Optimal path as a struct of arrays: the variant and cumulative cost of every song
+    # position, plus a reference to the song instead of one (chord, variant, cost) tuple
+    # per step. Iterating or indexing still yields those tuples.
+    __slots__ = ('song', 'variants', 'costs')
+
+    def __init__(self, song, variants, costs):
+        self.song = song
+        self.variants = variants
+        self.costs = costs
 
+    def __len__(self):
+        return len(self.variants)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        return (self.song[idx], int(self.variants[idx]), float(self.costs[idx]))
+
+    def __iter__(self):
+        for chord, variant, cost in zip(self.song, self.variants.tolist(), self.costs.tolist()):
+            yield (chord, variant, cost)
+
+    def __repr__(self):
+        return f"TracedPath({list(self)!r})"
+
+@timed('trace_path')
 def trace_path(song, F, G, chosen_row):
-    path = []
+    F = np.asarray(F)
+    V = F.shape[0]
+    # Walk the backpointers through a flat view, position by position
+    G = np.asarray(G)
+    backpointers = memoryview(np.ascontiguousarray(G.T).reshape(-1))
+
+    variants = array('b' if G.dtype == np.int8 else 'h')
     idx = len(song) - 1
     while idx >= 0:
-        path.append((song[idx], chosen_row, F[chosen_row][idx]))
-        chosen_row = G[chosen_row][idx]
+        variants.append(chosen_row)
+        chosen_row = backpointers[idx * V + chosen_row % V]
         idx -= 1
-    path.reverse()
-    return path
+    variants = np.frombuffer(variants, dtype=G.dtype)[::-1].copy()
 
-def print_results(path, df, csv_data=None):
-    logger.announcement("Optimal Path:", 'info')
+    costs = F[variants % V, np.arange(len(song))]
+    return TracedPath(song, variants, costs)
+
+def path_costs(centroids, variants):
+    # Cumulative cost at every position of a path given the (n, 3) centroids of the song,
+    # summed in the same order as dynamic_stage so the values match F along the same path
+    chosen = centroids[np.arange(len(variants)), variants]
+    step_costs = np.empty(len(variants))
+    step_costs[0] = 0.0
+    step_costs[1:] = (chosen[:-1] - chosen[1:]) ** 2
+    return np.cumsum(step_costs)
+
+@timed('print_results')
+def print_results(path, df, csv_data=None, output=None):
+    # Without an output stream the table goes to the logger, skip it when nobody listens
+    if output is None and not logger.enabled():
+        return
+    table = centroid_table(df)
     cumulative_cost = 0
+    lines = []
+    # Verify against CSV data if provided
+    marks = verification_marks([cost for _, _, cost in path], csv_data)
     
     for idx, (chord, variant, cost) in enumerate(path):
-        centroid = get_centroids(chord, df)[variant]
+        centroid = table.get(chord)[variant]
         cumulative_cost = cost
         sqrt_cost = math.sqrt(cumulative_cost)
-        
-        # Verify against CSV data if provided
-        csv_verification = ""
-        if csv_data is not None and idx < len(csv_data):
-            try:
-                expected_l2 = csv_data.iloc[idx]['L2 distance']
-            except:
-                expected_l2 = csv_data.iloc[idx]['Sqrt(total cost)']
-            diff = abs(sqrt_cost - expected_l2)
-            if diff < 0.1:
-                csv_verification = f"✓ (CSV: {expected_l2:.2f})"
-            else:
-                csv_verification = f"❌ (CSV: {expected_l2:.2f}, diff: {diff:.2f})"
-        
-        logger.announcement(
+
+        lines.append(
             f"For {chord} play variant {variant}. "
-            f"Centroid: {centroid:.2f}, Total cost: {sqrt_cost:.2f} {csv_verification}", 
-            'info_ns'
-        )
\ No newline at end of file
+            f"Centroid: {centroid:.2f}, Total cost: {sqrt_cost:.2f} {marks[idx]}"
+        )
+
+    logger.table("Optimal Path:", lines, output)
@@ -0,0 +1,55 @@
+import heapq
+from itertools import islice
+import numpy as np
+from src.utils.centroids import INVALID
+from src.algorithms.dynamic import TracedPath
+from src.utils.transitions import transition_cache
+
+def k_best_stage(song, df, k=10):
+    # List Viterbi: instead of the single best previous variant, every variant of every
+    # chord keeps its k cheapest partial paths. Each step merges the 3 sorted candidate
+    # lists of the previous chord (3k candidates) and keeps the k smallest.
+    # Returns up to k (cost, path) pairs, cheapest first, with each path a TracedPath.
+    # The first one is the path trace_path finds on the output of dynamic_stage.
+    if k < 1:
+        raise ValueError("k must be at least 1.")
+    transitions = transition_cache(df)
+
+    # costs[idx][i] are the sorted costs of the partial paths ending in variant i of chord idx,
+    # backpointers[idx][i] encode the previous (variant, rank) of each of them as variant * k + rank
+    # Like dynamic_stage, every variant of a single chord song costs nothing, while unplayable
+    # variants of the first chord cannot start a longer path
+    playable = [len(song) == 1 or centroid < INVALID for centroid in transitions.table.get(song[0])]
+    costs = [[[0.0] if start else [] for start in playable]]
+    backpointers = [[[-1] if start else [] for start in playable]]
+
+    for idx in range(1, len(song)):
+        matrix = transitions.matrix(song[idx - 1], song[idx])
+        prev_costs = costs[-1]
+        curr_costs = []
+        curr_backpointers = []
+        for i in range(3):  # Current variants
+            candidates = []
+            for j in range(3):  # Previous variants, invalid transitions have an infinite cost
+                cost = matrix[j][i]
+                if cost != float('inf') and prev_costs[j]:
+                    candidates.append([(prev_cost + cost, j, rank) for rank, prev_cost in enumerate(prev_costs[j])])
+            best = list(islice(heapq.merge(*candidates), k))
+            curr_costs.append([total_cost for total_cost, _, _ in best])
+            curr_backpointers.append([j * k + rank for _, j, rank in best])
+        costs.append(curr_costs)
+        backpointers.append(curr_backpointers)
+
+    # Cheapest k complete paths over the three variants of the last chord
+    endings = heapq.merge(*([(cost, i, rank) for rank, cost in enumerate(costs[-1][i])] for i in range(3)))
+
+    paths = []
+    for total_cost, variant, rank in islice(endings, k):
+        variants = np.empty(len(song), dtype=np.int8)
+        path_costs = np.empty(len(song))
+        for idx in range(len(song) - 1, -1, -1):
+            variants[idx] = variant
+            path_costs[idx] = costs[idx][variant][rank]
+            variant, rank = divmod(backpointers[idx][variant][rank], k)
+        paths.append((total_cost, TracedPath(song, variants, path_costs)))
+    return paths
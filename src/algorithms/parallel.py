@@ -0,0 +1,74 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from src.utils.centroids import INVALID, centroid_table
+from src.algorithms.core import min_plus, solve_dynamic, song_costs, transfer_matrix
+from src.algorithms.dynamic import TracedPath, dynamic_stage, path_costs, trace_path
+
+def chunk_matrix(centroids):
+    # Min-plus transfer matrix from the variant of the first chord to the variant of the
+    # last one, for a chunk given by its (L, 3) centroids
+    return transfer_matrix(song_costs(centroids, valid=centroids < INVALID))[0]
+
+def chunk_paths(centroids, entry_costs):
+    # Run the dynamic program over a chunk from the cost of reaching every variant of its
+    # first chord, so ties are broken as in dynamic_stage, then trace the chunk back from
+    # each variant of its last chord. Returns the last row of F and the (3, L) paths.
+    _, F, G = solve_dynamic(centroids, valid=centroids < INVALID, start_costs=entry_costs)
+    paths = np.empty((len(centroids), 3), dtype=G.dtype)
+    paths[-1] = np.arange(3)
+    for idx in range(len(centroids) - 1, 0, -1):
+        paths[idx - 1] = G[idx][paths[idx] % 3]  # Same walk as trace_path
+    return F[-1], paths.T
+
+def parallel_stage(song, df, workers=None, chunks=None):
+    # Dynamic programming for very long songs spread over several processes. The song is
+    # cut into chunks that share their boundary chord and each worker computes the 3x3
+    # min-plus transfer matrix of its chunk. Chaining the matrices gives the cost of every
+    # variant at each chunk boundary, from which the workers rerun the dynamic program on
+    # their chunk and trace it back, and the chunk paths are joined from the last one.
+    # Returns the same TracedPath as trace_path on the output of dynamic_stage. The boundary
+    # costs are summed in a different order though, so paths whose costs only tie up to
+    # floating-point rounding may still be broken differently.
+    table = centroid_table(df)
+    centroids = table.song_centroids(song)
+    if len(song) == 1:
+        return TracedPath(song, np.zeros(1, dtype=np.int8), np.zeros(1))
+
+    workers = workers or os.cpu_count() or 1
+    chunks = min(chunks or workers, max(len(song) - 1, 1))
+
+    # Chunk k covers chords bounds[k] to bounds[k + 1], both included
+    bounds = np.linspace(0, len(song) - 1, chunks + 1).round().astype(int)
+    slices = [centroids[bounds[k]:bounds[k + 1] + 1] for k in range(chunks)]
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        mapper = executor.map if executor else map
+        matrices = list(mapper(chunk_matrix, slices))
+
+        # Cost of every variant at the first chord of each chunk, invalid variants of the
+        # first chord cannot start a path
+        entry_costs = [np.where(centroids[0] < INVALID, 0.0, np.inf)]
+        for matrix in matrices[:-1]:
+            entry_costs.append(min_plus(entry_costs[-1][None, :], matrix)[0][0])
+        results = list(mapper(chunk_paths, slices, entry_costs))
+    finally:
+        if executor:
+            executor.shutdown()
+
+    end_costs = results[-1][0]
+    if np.isinf(end_costs.min()):
+        # No playable path, keep the exact behavior of the plain dynamic program
+        chosen_row, F, G = dynamic_stage(song, table)
+        return trace_path(song, F, G, chosen_row)
+
+    # Join the chunks from the last one, each ending on the variant the next one starts with
+    variants = np.empty(len(song), dtype=results[-1][1].dtype)
+    end_variant = int(end_costs.argmin())
+    for k in range(chunks - 1, -1, -1):
+        chunk_path = results[k][1][end_variant % 3]
+        variants[bounds[k]:bounds[k + 1] + 1] = chunk_path
+        end_variant = int(chunk_path[0])
+
+    return TracedPath(song, variants, path_costs(centroids, variants))
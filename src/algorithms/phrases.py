@@ -0,0 +1,189 @@
+import weakref
+from collections import OrderedDict, namedtuple
+import numpy as np
+from src.utils.centroids import INVALID, centroid_table
+from src.utils.transitions import transition_cache
+from src.algorithms.core import song_costs, transfer_matrix
+from src.algorithms.dynamic import TracedPath, dynamic_stage, path_costs, trace_path
+
+# Large prime modulus for the rolling hash of chord index windows
+HASH_MODULUS = (1 << 61) - 1
+HASH_BASE = 1_000_003
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+def section_matrix(centroids):
+    # Section transfer matrix for a run of chords given by their (L, 3) centroids.
+    # matrix[s][e] is the cheapest way to go from variant s of the first chord to
+    # variant e of the last one, and paths[s][e] holds the variants along that way.
+    length = len(centroids)
+    matrix, backpointers = transfer_matrix(song_costs(centroids, valid=centroids < INVALID))
+
+    # Trace every (start, end) pair back at once
+    starts = np.repeat(np.arange(3), 3)
+    variants = np.tile(np.arange(3), 3)
+    paths = np.empty((length, 9), dtype=np.int8)
+    paths[-1] = variants
+    for idx in range(length - 2, -1, -1):
+        variants = backpointers[idx][starts, variants]
+        paths[idx] = variants
+    return matrix, paths.T.reshape(3, 3, length)
+
+class SectionCache:
+    # (matrix, paths) of each section keyed by the chords of the run, least recently used
+    # evicted first, so repeated verses and choruses are solved once across songs
+
+    def __init__(self, table, maxsize=1024):
+        self.table = table
+        self.maxsize = maxsize
+        self.sections = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def section(self, chords, indices):
+        section = self.sections.get(chords)
+        if section is not None:
+            self.hits += 1
+            self.sections.move_to_end(chords)
+            return section
+
+        self.misses += 1
+        matrix, paths = section_matrix(self.table.take(indices))
+        section = (matrix.tolist(), paths)
+        self.sections[chords] = section
+        if len(self.sections) > self.maxsize:
+            self.sections.popitem(last=False)
+        return section
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.sections))
+
+    def cache_clear(self):
+        self.sections.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+_caches = weakref.WeakKeyDictionary()
+
+
+def section_cache(df):
+    table = centroid_table(df)
+    cache = _caches.get(table)
+    if cache is None:
+        cache = SectionCache(table)
+        _caches[table] = cache
+    return cache
+
+def window_hashes(indices, run_length):
+    # Polynomial rolling hash of every window of run_length chord indices
+    hashes = []
+    top = pow(HASH_BASE, run_length - 1, HASH_MODULUS)
+    value = 0
+    for idx, chord in enumerate(indices):
+        if idx >= run_length:
+            value = (value - (indices[idx - run_length] + 1) * top) % HASH_MODULUS
+        value = (value * HASH_BASE + chord + 1) % HASH_MODULUS
+        if idx >= run_length - 1:
+            hashes.append(value)
+    return hashes
+
+def split_sections(indices, run_length):
+    # Split the song into (start, stop) runs. Windows of run_length chords that occur more
+    # than once become their own runs, the chords in between are grouped into literal runs.
+    indices = indices.tolist()
+    hashes = window_hashes(indices, run_length)
+    counts = {}
+    for value in hashes:
+        counts[value] = counts.get(value, 0) + 1
+
+    sections = []
+    literal_start = 0
+    idx = 0
+    while idx < len(indices):
+        if idx < len(hashes) and counts[hashes[idx]] > 1:
+            if literal_start < idx:
+                sections.append((literal_start, idx))
+            sections.append((idx, idx + run_length))
+            idx += run_length
+            literal_start = idx
+        else:
+            idx += 1
+    if literal_start < len(indices):
+        sections.append((literal_start, len(indices)))
+    return sections
+
+def phrase_stage(song, df, run_length=8):
+    # Optimal path through the song built from section transfer matrices. Each distinct
+    # run of chords is solved once (and cached across songs), then the sections are
+    # chained with a small dynamic program over the variants at section boundaries.
+    # The cost is the one dynamic_stage finds, but each section's costs are summed from
+    # its own start, so where several paths cost the same up to rounding the variants
+    # can differ from trace_path on the output of dynamic_stage.
+    table = centroid_table(df)
+    cache = section_cache(table)
+    transitions = transition_cache(table)
+    indices = table.indices(song)
+    centroids = table.take(indices)
+
+    if len(song) == 1:
+        return TracedPath(song, np.zeros(1, dtype=np.int8), np.zeros(1))
+
+    sections = split_sections(indices, run_length)
+    matrices = []
+    for start, stop in sections:
+        matrices.append(cache.section(tuple(song[start:stop]), indices[start:stop]))
+
+    # Invalid variants of the first chord cannot start a path
+    matrix = matrices[0][0]
+    start_costs = [0.0 if centroid < INVALID else float('inf') for centroid in centroids[0].tolist()]
+    costs = [float('inf')] * 3
+    first_starts = [-1] * 3
+    for s in range(3):
+        for e in range(3):
+            total_cost = start_costs[s] + matrix[s][e]
+            if total_cost < costs[e]:
+                costs[e] = total_cost
+                first_starts[e] = s
+
+    # Chain the sections: from the end variant j of the previous section, through the
+    # boundary transition to its start variant s, to the end variant e of the next one.
+    # Plain loops are cheaper than NumPy for these 3x3 steps.
+    backpointers = []
+    for k in range(1, len(sections)):
+        boundary = transitions.matrix(song[sections[k - 1][1] - 1], song[sections[k][0]])
+        matrix = matrices[k][0]
+        curr_costs = [float('inf')] * 3
+        prev_ends = [-1] * 3
+        starts = [-1] * 3
+        for j in range(3):
+            for s in range(3):
+                boundary_cost = costs[j] + boundary[j][s]
+                if boundary_cost == float('inf'):
+                    continue
+                for e in range(3):
+                    total_cost = boundary_cost + matrix[s][e]
+                    if total_cost < curr_costs[e]:
+                        curr_costs[e] = total_cost
+                        prev_ends[e] = j
+                        starts[e] = s
+        costs = curr_costs
+        backpointers.append((prev_ends, starts))
+
+    if min(costs) == float('inf'):
+        # No playable path, keep the exact behavior of the plain dynamic program
+        chosen_row, F, G = dynamic_stage(song, table)
+        return trace_path(song, F, G, chosen_row)
+
+    # Trace the boundaries back and fill in every section from its stored paths
+    variants = np.empty(len(song), dtype=np.int8)
+    end = costs.index(min(costs))
+    for k in range(len(sections) - 1, 0, -1):
+        prev_ends, starts = backpointers[k - 1]
+        start, stop = sections[k]
+        variants[start:stop] = matrices[k][1][starts[end], end]
+        end = prev_ends[end]
+    start, stop = sections[0]
+    variants[start:stop] = matrices[0][1][first_starts[end], end]
+
+    return TracedPath(song, variants, path_costs(centroids, variants))
@@ -0,0 +1,150 @@
+import os
+import json
+import asyncio
+import hashlib
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from src.utils.logger import logger
+from src.utils.chords_loader import chord_store
+from src.utils.centroids import centroid_table
+from src.algorithms.batch import init_worker, solve_song
+
+# Longest request line accepted, enough for songs of about a million chords
+LINE_LIMIT = 1 << 24
+
+class SolverService:
+    # Long-running solver. The chord table is opened once and shared with a process pool
+    # that runs the solves off the event loop. Identical songs arriving while one of them is
+    # being solved wait for that solve instead of starting their own, and the results of the
+    # most recently requested songs are kept in an LRU cache keyed by the hash of the song.
+
+    def __init__(self, chords_df=None, workers=None, maxsize=1024):
+        self.table = centroid_table(chords_df if chords_df is not None else chord_store())
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker, initargs=(self.table,))
+        self.maxsize = maxsize
+        self.results = OrderedDict()
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'cached': len(self.results),
+            'pending': len(self.pending),
+            'maxsize': self.maxsize,
+            'workers': self.workers,
+        }
+
+    async def solve(self, chords):
+        # Returns (path, cost, unknown, cached) for a list of chord names, unknown being the
+        # chords missing from the dictionary that were left out of the song
+        song = [chord.strip().lower() for chord in chords]
+        unknown = sorted({chord for chord in song if chord and chord not in self.table})
+        song = [chord for chord in song if chord in self.table]
+        if not song:
+            raise ValueError("No valid chords found in the song!")
+        key = hashlib.sha256("\n".join(song).encode()).digest()
+
+        result = self.results.get(key)
+        if result is not None:
+            self.hits += 1
+            self.results.move_to_end(key)
+            return (*result, unknown, True)
+
+        future = self.pending.get(key)
+        if future is None:
+            self.misses += 1
+            future = asyncio.get_running_loop().run_in_executor(self.executor, solve_song, song)
+            self.pending[key] = future
+            future.add_done_callback(lambda done: self.finish(key, done))
+        else:
+            self.coalesced += 1
+        # Shielded so a client that disconnects does not cancel the solve for the others
+        path, cost = await asyncio.shield(future)
+        return path, cost, unknown, False
+
+    def finish(self, key, future):
+        del self.pending[key]
+        if future.cancelled() or future.exception() is not None:
+            return
+        self.results[key] = future.result()
+        if len(self.results) > self.maxsize:
+            self.results.popitem(last=False)
+
+    async def respond(self, line):
+        # One request per line: a JSON object {"id": ..., "chords": [...]}, {"command": "stats"},
+        # a JSON list of chords, or chords separated by spaces or commas
+        request_id = None
+        try:
+            text = line.decode().strip()
+            if text.startswith('{'):
+                request = json.loads(text)
+                request_id = request.get('id')
+                if request.get('command') == 'stats':
+                    return {'id': request_id, 'stats': self.stats()}
+                chords = request['chords']
+            elif text.startswith('['):
+                chords = json.loads(text)
+            else:
+                chords = text.replace(',', ' ').split()
+
+            path, cost, unknown, cached = await self.solve(chords)
+            return {'id': request_id, 'cost': cost, 'path': path, 'unknown': unknown, 'cached': cached}
+        except Exception as e:
+            return {'id': request_id, 'error': str(e)}
+
+    async def handle(self, reader, writer):
+        # Requests of one connection are answered in order, connections are served concurrently
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                response = await self.respond(line)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError) as e:
+            logger.warning(f"Dropping connection: {e}")
+        finally:
+            writer.close()
+
+async def serve(service, host='127.0.0.1', port=8765, path=None):
+    # Listen on a unix socket when a path is given, otherwise on a local TCP port
+    if path:
+        server = await asyncio.start_unix_server(service.handle, path=path, limit=LINE_LIMIT)
+        logger.success(f"Solver service listening on {path}")
+    else:
+        server = await asyncio.start_server(service.handle, host, port, limit=LINE_LIMIT)
+        logger.success(f"Solver service listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve optimal fingering paths over a local socket, one JSON response line per request line.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', help="Unix socket path to listen on instead of a TCP port.")
+    parser.add_argument('--workers', type=int, help="Solver processes (default: one per CPU).")
+    parser.add_argument('--cache-size', type=int, default=1024, help="Number of solved songs to keep.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    service = SolverService(workers=args.workers, maxsize=args.cache_size)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        logger.info("Solver service stopped.")
+    finally:
+        service.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+from collections import deque
+from src.utils.logger import logger
+from src.utils.centroids import INVALID, centroid_table
+
+class StreamingDynamic:
+    # Incremental version of dynamic_stage for chords that arrive one at a time.
+    # Only the current 3-entry cost frontier and the F/G columns of the last `lag`
+    # chords are kept. Older chords are committed to a fixed variant, so memory stays
+    # bounded. With lag=None nothing is committed and best_path() always matches
+    # trace_path on the chords seen so far.
+
+    def __init__(self, df, lag=None):
+        if lag is not None and lag < 1:
+            raise ValueError("lag must be a positive number of chords or None.")
+        self.table = centroid_table(df)
+        self.lag = lag
+        self.length = 0  # Chords pushed so far
+        self.committed = []  # (chord, variant, cost) tuples decided for good, not yet drained
+        self.chords = deque()  # Chords in the window that are still undecided
+        self.costs = deque()  # F column of every chord in the window
+        self.backpointers = deque()  # G column of every chord in the window
+        self.prev_centroids = None
+
+    def push(self, chord):
+        # Add the next chord and update the frontier, returns False for unknown chords
+        chord = chord.strip().lower()
+        if chord not in self.table:
+            logger.warning(f"Skipping unknown chord {chord}")
+            return False
+        curr_centroids = self.table.get(chord)
+
+        if self.prev_centroids is None:
+            F = [0, 0, 0]  # Start with zero cost
+            G = (0, 1, 2)  # Start with each variant
+        else:
+            prev_costs = self.costs[-1]
+            F = [float('inf')] * 3
+            G = [-1] * 3
+            for i in range(3):  # Current variants
+                for j in range(3):  # Previous variants
+                    if self.prev_centroids[j] >= INVALID or curr_centroids[i] >= INVALID:
+                        continue
+                    total_cost = prev_costs[j] + (self.prev_centroids[j] - curr_centroids[i]) ** 2
+                    if total_cost < F[i]:
+                        F[i] = total_cost
+                        G[i] = j
+            G = tuple(G)
+
+        self.chords.append(chord)
+        self.costs.append(F)
+        self.backpointers.append(G)
+        self.prev_centroids = curr_centroids
+        self.length += 1
+
+        if self.lag is not None and len(self.chords) > self.lag:
+            self.commit()
+        return True
+
+    def best_row(self):
+        # Variant of the last chord with the lowest cost so far
+        frontier = self.costs[-1]
+        return frontier.index(min(frontier))
+
+    def best_cost(self):
+        return min(self.costs[-1]) if self.costs else 0
+
+    def ancestor(self, row):
+        # Variant of the oldest chord in the window on the best path ending at row
+        for idx in range(len(self.chords) - 1, 0, -1):
+            row = self.backpointers[idx][row]
+        return row
+
+    def best_path(self):
+        # Committed chords that were not drained followed by the best path through the window,
+        # traced back like trace_path
+        path = []
+        if self.chords:
+            chosen_row = self.best_row()
+            for idx in range(len(self.chords) - 1, -1, -1):
+                path.append((self.chords[idx], chosen_row, self.costs[idx][chosen_row]))
+                chosen_row = self.backpointers[idx][chosen_row]
+            path.reverse()
+        return self.committed + path
+
+    def commit(self):
+        # Fix the variant of the oldest chord in the window to the one on the current best path
+        variant = self.ancestor(self.best_row())
+
+        # Drop frontier variants whose best path goes through another variant of that chord,
+        # so later paths always extend the committed decisions
+        frontier = self.costs[-1]
+        for row in range(3):
+            if frontier[row] != float('inf') and self.ancestor(row) != variant:
+                frontier[row] = float('inf')
+
+        chord = self.chords.popleft()
+        costs = self.costs.popleft()
+        self.backpointers.popleft()
+        self.committed.append((chord, variant, costs[variant]))
+
+    def drain(self):
+        # Return the committed decisions and forget them, for callers that consume them as they come
+        committed = self.committed
+        self.committed = []
+        return committed
@@ -0,0 +1,99 @@
+import weakref
+import numpy as np
+from src.utils.profiler import timed
+
+# Centroid value used to mark a variant that cannot be played
+INVALID = 10000.0
+
+# Each chord row holds three variants of 7 columns: the fret followed by six strings
+VARIANTS = 3
+VARIANT_WIDTH = 7
+
+
+@timed('compute_centroids')
+def compute_centroids(placements):
+    # Work on a float copy with NaN values replaced by -1, like the original per-row code
+    placements = np.array(placements, dtype=np.float64)
+    placements[np.isnan(placements)] = -1.0
+
+    centroids = np.empty((placements.shape[0], VARIANTS), dtype=np.float64)
+    for variant in range(VARIANTS):
+        i = variant * VARIANT_WIDTH
+        frets = placements[:, i]
+        # Missing fret means open position, otherwise fix fret to work with finger values
+        fret = np.where(frets == -1, 0.0, frets - 1)
+
+        # Accumulate string by string to keep the same summation order as before
+        total_sum = np.zeros(placements.shape[0], dtype=np.float64)
+        divisor = np.zeros(placements.shape[0], dtype=np.int64)
+        for x in range(i + 1, i + VARIANT_WIDTH):
+            played = placements[:, x] != -1
+            total_sum += np.where(played, fret + placements[:, x], 0.0)
+            divisor += played
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            column = np.where(divisor != 0, total_sum / divisor, 0.0)
+        # Frets outside the playable range make the variant invalid
+        column[frets > 7] = INVALID
+        centroids[:, variant] = column
+
+    # Check for non-existent 2nd and 3rd variants
+    centroids[(placements[:, 8:13] == -1).all(axis=1), 1] = INVALID
+    centroids[(placements[:, 15:20] == -1).all(axis=1), 2] = INVALID
+
+    return centroids
+
+
+class CentroidTable:
+    # Dense (n_chords, 3) centroid array plus a chord name -> row index
+
+    def __init__(self, names, centroids):
+        self.names = list(names)
+        self.index = {name: row for row, name in enumerate(self.names)}
+        self.centroids = centroids
+
+    @classmethod
+    def from_dataframe(cls, df):
+        return cls(df.index, compute_centroids(df.values))
+
+    def __contains__(self, chord):
+        return chord in self.index
+
+    def __len__(self):
+        return len(self.names)
+
+    def take(self, rows):
+        # Centroids of the given chord rows, the only way solvers read the table
+        return self.centroids[rows]
+
+    def get(self, chord):
+        return self.take(self.index[chord]).tolist()
+
+    def indices(self, song):
+        return np.fromiter((self.index[chord] for chord in song), dtype=np.intp, count=len(song))
+
+    def song_centroids(self, song):
+        return self.take(self.indices(song))
+
+
+_tables = {}
+
+
+def centroid_table(df):
+    # Accept an already built table, otherwise build one per DataFrame and reuse it
+    if isinstance(df, CentroidTable):
+        return df
+    key = id(df)
+    table = _tables.get(key)
+    if table is None:
+        table = CentroidTable.from_dataframe(df)
+        _tables[key] = table
+        weakref.finalize(df, _tables.pop, key, None)
+    return table
+
+
+# The get_centroids function returns the centroids of a chord's 3 possible variants.
+# These centroids represent the average positions of the fretboard and string
+# placements required to play each variant of the chord.
+def get_centroids(chord, df):
+    return centroid_table(df).get(chord)
@@ -0,0 +1,68 @@
+import numpy as np
+from src.utils.centroids import VARIANTS, VARIANT_WIDTH, CentroidTable, compute_centroids
+
+class ChordStore(CentroidTable):
+    # Chord dictionary that only builds the chord name -> row index up front. Placements
+    # stay in their source, the memory-mapped chord cache or a CSV file read at stored byte
+    # offsets, and centroids are computed the first time a chord is used, then memoized.
+    # Pickling a store only sends its source, so worker processes reopen it themselves.
+
+    def __init__(self, names, placements=None, offsets=None, source=None):
+        self.names = list(names)
+        self.index = {name: row for row, name in enumerate(self.names)}
+        self.placements = placements  # Row-indexable placements, e.g. a memory-mapped array
+        self.offsets = offsets  # Byte offset of every row in the CSV source
+        self.source = source
+        self.centroids = np.zeros((len(self.names), VARIANTS))
+        self.ready = np.zeros(len(self.names), dtype=bool)
+
+    @classmethod
+    def from_cache(cls, chord_dict_file):
+        from src.utils.chords_loader import load_chord_placements
+        names, placements, _ = load_chord_placements(chord_dict_file)
+        return cls(names, placements=placements, source=chord_dict_file)
+
+    @classmethod
+    def from_csv(cls, csv_file):
+        # One pass over the file that only records where each chord row starts
+        names = []
+        offsets = []
+        with open(csv_file, 'rb') as file:
+            offset = 0
+            for line in file:
+                name = line.split(b',', 1)[0].decode().strip().lower()
+                if name:
+                    names.append(name)
+                    offsets.append(offset)
+                offset += len(line)
+        return cls(names, offsets=np.array(offsets, dtype=np.int64), source=csv_file)
+
+    def __reduce__(self):
+        if self.offsets is not None:
+            return (ChordStore.from_csv, (self.source,))
+        return (ChordStore.from_cache, (self.source,))
+
+    def row_placements(self, rows):
+        if self.offsets is None:
+            return np.asarray(self.placements[rows], dtype=np.float64)
+
+        placements = np.full((len(rows), VARIANTS * VARIANT_WIDTH), np.nan)
+        with open(self.source, 'rb') as file:
+            for idx, row in enumerate(rows):
+                file.seek(self.offsets[row])
+                values = file.readline().decode().rstrip('\r\n').split(',')[1:VARIANTS * VARIANT_WIDTH + 1]
+                placements[idx, :len(values)] = [float(value) if value.strip() else np.nan for value in values]
+        return placements
+
+    def take(self, rows):
+        # Compute the centroids of rows that were never used before, then read them as usual
+        rows = np.asarray(rows)
+        missing = np.unique(rows[~self.ready[rows]])
+        if missing.size:
+            self.centroids[missing] = compute_centroids(self.row_placements(missing))
+            self.ready[missing] = True
+        return self.centroids[rows]
+
+    def materialized(self):
+        # Number of chords whose centroids were computed so far
+        return int(self.ready.sum())
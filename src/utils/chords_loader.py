@@ -1,8 +1,17 @@
 import os
-import pandas as pd
+import json
+import hashlib
+import numpy as np
 from src.utils.logger import logger
+from src.utils.profiler import timed
+from src.utils.chord_store import ChordStore
 
+# Bump when the layout of the cache files changes
+CACHE_VERSION = 1
+
+@timed('chords_loader')
 def chords_loader():
+    import pandas as pd
 
     logger.info("Loading chord dictionary...")
 
@@ -16,12 +25,104 @@ def chords_loader():
 
     # Read file
     try:
-        df_temp = pd.read_excel(chord_dict_path + chord_dict_filename)
-        df = df_temp.set_index(df_temp.columns[0])
-        df.index = df.index.str.strip().str.lower()
+        names, placements, metadata = load_chord_placements(chord_dict_path + chord_dict_filename)
+        df = pd.DataFrame(placements, index=pd.Index(names, name=metadata['index_name']), columns=metadata['columns'])
         logger.success("Chord data loaded successfully.")
     except Exception as e:
         logger.error(f"Error loading chord dictionary: {e}")
         raise Exception(f"Error loading chord dictionary: {e}")
 
-    return df
\ No newline at end of file
+    return df
+
+@timed('chord_store')
+def chord_store(chord_dict_file=None):
+    # Lazy alternative to chords_loader: no DataFrame, only the chord index and the
+    # memory-mapped placements, with centroids computed for the chords songs actually use
+    logger.info("Opening chord store...")
+
+    if chord_dict_file is None:
+        chord_dict_file = os.getcwd() + "/src/lib/chords/guitar_dict.xlsx"
+    if not os.path.exists(chord_dict_file):
+        logger.error("Required files not found!")
+        raise FileNotFoundError("Required files not found!")
+
+    try:
+        store = ChordStore.from_cache(chord_dict_file)
+        logger.success("Chord store opened successfully.")
+    except Exception as e:
+        logger.error(f"Error opening chord store: {e}")
+        raise Exception(f"Error opening chord store: {e}")
+
+    return store
+
+def cache_paths(chord_dict_file):
+    # The cache lives next to the workbook: a .npy array of placements and a .json index
+    return chord_dict_file + ".cache.npy", chord_dict_file + ".cache.json"
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_chord_placements(chord_dict_file):
+    # Return (names, placements, metadata) for the chord dictionary. Placements come
+    # memory-mapped from the binary cache, which is rebuilt from the workbook when missing
+    # or when the workbook changed since it was written.
+    array_path, index_path = cache_paths(chord_dict_file)
+    source = os.stat(chord_dict_file)
+
+    try:
+        with open(index_path, 'r') as file:
+            metadata = json.load(file)
+        if metadata['version'] != CACHE_VERSION:
+            raise ValueError("Outdated chord cache version")
+
+        if (metadata['source_size'], metadata['source_mtime_ns']) != (source.st_size, source.st_mtime_ns):
+            # The file was touched, only rebuild when its contents really changed
+            if metadata['source_sha256'] != file_hash(chord_dict_file):
+                raise ValueError("Chord dictionary changed since the cache was written")
+            metadata['source_size'], metadata['source_mtime_ns'] = source.st_size, source.st_mtime_ns
+            write_json(index_path, metadata)
+
+        placements = np.load(array_path, mmap_mode='r')
+        if placements.shape != (len(metadata['names']), len(metadata['columns'])):
+            raise ValueError("Chord cache does not match its index")
+        return metadata['names'], placements, metadata
+    except (OSError, ValueError, KeyError) as e:
+        logger.info(f"Building chord dictionary cache ({e})...")
+
+    # Parse the workbook and write a fresh cache, pandas and openpyxl are only needed here
+    import pandas as pd
+    df_temp = pd.read_excel(chord_dict_file)
+    df = df_temp.set_index(df_temp.columns[0])
+    df.index = df.index.str.strip().str.lower()
+    placements = np.ascontiguousarray(df.values, dtype=np.float64)
+    metadata = {
+        'version': CACHE_VERSION,
+        'source_size': source.st_size,
+        'source_mtime_ns': source.st_mtime_ns,
+        'source_sha256': file_hash(chord_dict_file),
+        'index_name': df.index.name,
+        'columns': [str(column) for column in df.columns],
+        'names': df.index.tolist(),
+    }
+
+    try:
+        temp_path = array_path + ".tmp.npy"
+        np.save(temp_path, placements)
+        os.replace(temp_path, array_path)
+        write_json(index_path, metadata)
+        logger.success("Chord dictionary cache written.")
+    except OSError as e:
+        logger.warning(f"Could not write chord dictionary cache: {e}")
+
+    return metadata['names'], placements, metadata
+
+def write_json(path, data):
+    # Write through a temporary file so readers never see a partial index
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w') as file:
+        json.dump(data, file)
+    os.replace(temp_path, path)
@@ -1,24 +1,39 @@
-from rich.logging import RichHandler
-from rich.console import Console
-from rich.theme import Theme
 import logging
 
+class LazyRichHandler(logging.Handler):
+    # Builds the rich console and handler on the first record it has to emit, so importing
+    # the logger, or only logging below its level, never imports rich
+
+    def __init__(self):
+        super().__init__()
+        self.handler = None
+
+    def rich_handler(self):
+        if self.handler is None:
+            from rich.logging import RichHandler
+            from rich.console import Console
+            from rich.theme import Theme
+            custom_theme = Theme({
+                "info": "cyan",
+                "warning": "yellow",
+                "error": "bold red",
+                "critical": "bold white on red",
+            })
+            self.handler = RichHandler(console=Console(theme=custom_theme), rich_tracebacks=True)
+            self.handler.setFormatter(logging.Formatter("%(message)s", datefmt="[%X]"))
+        return self.handler
+
+    def emit(self, record):
+        self.rich_handler().handle(record)
+
 class Logger:
     def __init__(self):
-        custom_theme = Theme({
-            "info": "cyan",
-            "warning": "yellow",
-            "error": "bold red",
-            "critical": "bold white on red",
-        })
-        self.console = Console(theme=custom_theme)
-        logging.basicConfig(
-            level=logging.DEBUG,
-            format="%(message)s",
-            datefmt="[%X]",
-            handlers=[RichHandler(console=self.console, rich_tracebacks=True)]
-        )
+        # Configure only our own logger, the root logger is left to the application
+        self.handler = LazyRichHandler()
         self.logger = logging.getLogger("rich")
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.addHandler(self.handler)
+        self.logger.propagate = False
 
         # Suppress other logs
         logging.getLogger('werkzeug').setLevel(logging.ERROR)
@@ -33,6 +48,18 @@ class Logger:
         logging.getLogger('chardet').setLevel(logging.ERROR)
         logging.getLogger('sqlalchemy').setLevel(logging.ERROR)
 
+    @property
+    def console(self):
+        return self.handler.rich_handler().console
+
+    def set_level(self, level):
+        # e.g. logging.WARNING to keep library calls quiet, or logging.CRITICAL + 1 for silence
+        self.logger.setLevel(level)
+
+    def enabled(self, level=logging.INFO):
+        # Lets callers skip building messages nobody will see
+        return self.logger.isEnabledFor(level)
+
     def info(self, message):
         self.logger.debug(f"[blue]{message}[/blue]", extra={'markup': True})
 
@@ -58,4 +85,14 @@ class Logger:
     def error(self, message):
         self.logger.error(f"[red]{message}[/red]\n", extra={'markup': True})
 
+    def table(self, title, lines, output=None):
+        # Emit a whole result table. Given an output stream, the table is written as plain
+        # text in a single call, otherwise every line goes through the rich handler
+        if output is not None:
+            output.write(f"{title}\n" + "".join(f"{line}\n" for line in lines))
+            return
+        self.announcement(title, 'info')
+        for line in lines:
+            self.announcement(line, 'info_ns')
+
 logger = Logger()
@@ -0,0 +1,107 @@
+import json
+import time
+import cProfile
+import functools
+from contextlib import contextmanager
+
+class Profiler:
+    # Opt-in stage timers and counters for the whole pipeline. While disabled, timed
+    # functions only pay one attribute check per call and counters are ignored.
+    # Stage times are inclusive, a stage that runs inside another is counted in both.
+
+    def __init__(self):
+        self.enabled = False
+        self.timings = {}  # Stage name -> [calls, total seconds, max seconds]
+        self.counters = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.timings.clear()
+        self.counters.clear()
+
+    def record(self, name, elapsed):
+        timing = self.timings.setdefault(name, [0, 0.0, 0.0])
+        timing[0] += 1
+        timing[1] += elapsed
+        timing[2] = max(timing[2], elapsed)
+
+    def count(self, name, value=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        return {
+            'stages': {
+                name: {'calls': calls, 'total_ms': total * 1000, 'max_ms': longest * 1000}
+                for name, (calls, total, longest) in self.timings.items()
+            },
+            'counters': dict(self.counters),
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        # Prometheus text exposition format, one metric family per line group
+        lines = [
+            "# HELP fingering_stage_seconds_total Time spent in each pipeline stage.",
+            "# TYPE fingering_stage_seconds_total counter",
+        ]
+        lines += [f'fingering_stage_seconds_total{{stage="{name}"}} {total}' for name, (_, total, _) in self.timings.items()]
+        lines += [
+            "# HELP fingering_stage_calls_total Number of calls of each pipeline stage.",
+            "# TYPE fingering_stage_calls_total counter",
+        ]
+        lines += [f'fingering_stage_calls_total{{stage="{name}"}} {calls}' for name, (calls, _, _) in self.timings.items()]
+        for name, value in self.counters.items():
+            lines += [f"# TYPE fingering_{name}_total counter", f"fingering_{name}_total {value}"]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        # Prometheus text for .prom files, JSON otherwise
+        with open(path, 'w') as file:
+            file.write(self.to_prometheus() if path.endswith('.prom') else self.to_json())
+
+profiler = Profiler()
+
+def timed(name):
+    # Decorator recording every call of a function as a stage of the shared profiler
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+@contextmanager
+def cprofile(path):
+    # Run the enclosed code under cProfile and dump the stats to path, for pstats or snakeviz
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
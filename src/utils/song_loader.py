@@ -1,30 +1,36 @@
 import os
-import time
+from collections import Counter, namedtuple
+import numpy as np
 from src.utils.logger import logger
-import pandas as pd
+from src.utils.profiler import profiler, timed
+from src.utils.centroids import centroid_table
 
-def song_loader(chords_df, number_of_chords, song_name):
+SONGS_PATH = os.path.join("src", "lib", "songs")
+CSV_PATH = os.path.join(SONGS_PATH, "sources", "csv")
+
+# Songs loaded in bulk: the song files, one int32 array of chord rows per song and the
+# number of times each chord missing from the dictionary was seen across all of them
+LoadedSongs = namedtuple('LoadedSongs', ['files', 'indices', 'unknown'])
+
+@timed('song_loader')
+def song_loader(chords_df, number_of_chords, song_name, verify=False):
 
     logger.info("Loading song file...")
 
     # Load song file
-    current_dir = os.getcwd()
-    songs_path = current_dir + "/src/lib/songs/"
+    songs_path = os.path.join(os.getcwd(), SONGS_PATH)
 
     if number_of_chords == 0:
         song_file = f"{song_name}.txt"
     else:
         song_file = f"{song_name}_{number_of_chords}.txt"
 
-    song_df = pd.read_csv(songs_path + f"/sources/csv/{song_name}.csv")
-
-    if not os.path.exists(songs_path + song_file):
+    if not os.path.exists(os.path.join(songs_path, song_file)):
         logger.error("Required files not found!")
         raise FileNotFoundError("Required files not found!")
-    
+
     try:
-        with open(songs_path + song_file, 'r') as file:
-            song = [line.strip().lower() for line in file]
+        song = read_song_file(os.path.join(songs_path, song_file))
         logger.success("Song file loaded successfully.")
     except Exception as e:
         logger.error(f"Error loading song file: {e}")
@@ -36,4 +42,61 @@ def song_loader(chords_df, number_of_chords, song_name):
         logger.error("No valid chords found in the song!")
         raise Exception("No valid chords found in the song!")
     logger.success(f"Success: {song}")
+    profiler.count('songs')
+    profiler.count('chords', len(song))
+
+    # The verification CSV is only parsed when the caller wants to check the results
+    song_df = song_csv_loader(song_name) if verify else None
     return song, song_df
+
+@timed('song_csv_loader')
+def song_csv_loader(song_name):
+    # Expected results of a bundled song, as exported to src/lib/songs/sources/csv
+    import pandas as pd
+    return pd.read_csv(os.path.join(os.getcwd(), CSV_PATH, f"{song_name}.csv"))
+
+def read_song_file(song_path):
+    # One chord per line, normalized like the chord dictionary index
+    with open(song_path, 'r') as file:
+        return [line.strip().lower() for line in file]
+
+def song_files(songs):
+    # Accept a directory or a list of song files and directories, keeping the given order
+    if isinstance(songs, (str, os.PathLike)):
+        songs = [songs]
+
+    files = []
+    for song in songs:
+        if os.path.isdir(song):
+            files.extend(sorted(
+                os.path.join(song, name) for name in os.listdir(song)
+                if name.endswith('.txt') and os.path.isfile(os.path.join(song, name))
+            ))
+        else:
+            files.append(song)
+    return files
+
+@timed('load_songs')
+def load_songs(songs, chords_df):
+    # Read many song files at once and map their chords straight to dictionary rows.
+    # Chords missing from the dictionary are dropped and reported together at the end.
+    index = centroid_table(chords_df).index
+    files = song_files(songs)
+
+    indices = []
+    unknown = Counter()
+    for song_file in files:
+        with open(song_file, 'r') as file:
+            chords = [line.strip() for line in file.read().lower().split('\n')]
+        rows = [index.get(chord, -1) for chord in chords]
+        if -1 in rows:
+            unknown.update(chord for chord, row in zip(chords, rows) if row == -1 and chord)
+            rows = [row for row in rows if row != -1]
+        indices.append(np.array(rows, dtype=np.int32))
+
+    profiler.count('songs', len(files))
+    profiler.count('chords', sum(song.size for song in indices))
+    profiler.count('unknown_chords', sum(unknown.values()))
+    if unknown:
+        logger.warning(f"{sum(unknown.values())} unknown chords skipped in {len(files)} songs: {', '.join(sorted(unknown))}")
+    return LoadedSongs(files, indices, unknown)
@@ -0,0 +1,60 @@
+import weakref
+from collections import OrderedDict, namedtuple
+from src.utils.centroids import INVALID, centroid_table
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+class TransitionCache:
+    # Memoized 3x3 transition matrices keyed by (prev_chord, curr_chord), with the least
+    # recently used pairs evicted once maxsize is reached. matrix[j][i] is the squared
+    # centroid difference from variant j of prev_chord to variant i of curr_chord, and
+    # inf when variant i of curr_chord is invalid. Invalid variants of prev_chord keep
+    # their raw cost, like the transitions of the solver core in src/algorithms/core.py.
+
+    def __init__(self, table, maxsize=4096):
+        self.table = table
+        self.maxsize = maxsize
+        self.matrices = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def matrix(self, prev_chord, curr_chord):
+        key = (prev_chord, curr_chord)
+        matrix = self.matrices.get(key)
+        if matrix is not None:
+            self.hits += 1
+            self.matrices.move_to_end(key)
+            return matrix
+
+        self.misses += 1
+        prev_centroids = self.table.get(prev_chord)
+        curr_centroids = self.table.get(curr_chord)
+        matrix = tuple(
+            tuple(float('inf') if curr_centroid >= INVALID else (prev_centroid - curr_centroid) ** 2 for curr_centroid in curr_centroids)
+            for prev_centroid in prev_centroids
+        )
+        self.matrices[key] = matrix
+        if len(self.matrices) > self.maxsize:
+            self.matrices.popitem(last=False)
+        return matrix
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.matrices))
+
+    def cache_clear(self):
+        self.matrices.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+_caches = weakref.WeakKeyDictionary()
+
+
+def transition_cache(df):
+    # One shared cache per centroid table, so every algorithm reuses the same matrices
+    table = centroid_table(df)
+    cache = _caches.get(table)
+    if cache is None:
+        cache = TransitionCache(table)
+        _caches[table] = cache
+    return cache
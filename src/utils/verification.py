@@ -0,0 +1,52 @@
+from collections import namedtuple
+import numpy as np
+
+# Exported songs name their cumulative cost column one of these ways
+COST_COLUMNS = ['L2 distance', 'Sqrt(total cost)']
+# Allow small floating-point differences, the CSV values are rounded to 2 decimals
+TOLERANCE = 0.1
+
+Mismatch = namedtuple('Mismatch', ['position', 'chord', 'expected', 'computed', 'diff'])
+# Result of checking one path: the CSV column used, how many positions were compared out of
+# the path and CSV lengths, the positions off by more than the tolerance and the largest difference
+VerificationReport = namedtuple('VerificationReport', ['song', 'column', 'checked', 'steps', 'rows', 'mismatches', 'max_diff', 'ok'])
+
+def cost_column(csv_data):
+    for column in COST_COLUMNS:
+        if column in csv_data.columns:
+            return column
+    raise KeyError(f"No cost column in CSV data, expected one of {COST_COLUMNS}")
+
+def expected_costs(csv_data):
+    # Square root of the cumulative cost at every position, as exported
+    return csv_data[cost_column(csv_data)].to_numpy(dtype=np.float64)
+
+def verify_costs(chords, costs, csv_data, song=None, tolerance=TOLERANCE):
+    # Compare the cumulative costs of a path with the CSV, position by position up to the
+    # shorter of the two
+    expected = expected_costs(csv_data)
+    checked = min(len(costs), len(expected))
+    computed = np.sqrt(np.asarray(costs[:checked], dtype=np.float64))
+    diff = np.abs(computed - expected[:checked])
+
+    mismatches = [
+        Mismatch(int(position), chords[position], float(expected[position]), float(computed[position]), float(diff[position]))
+        for position in np.flatnonzero(~(diff < tolerance))
+    ]
+    max_diff = float(diff.max()) if checked else 0.0
+    return VerificationReport(song, cost_column(csv_data), checked, len(costs), len(expected), mismatches, max_diff, not mismatches)
+
+def verification_marks(costs, csv_data, tolerance=TOLERANCE):
+    # Check mark or difference per path position for the result tables, empty past the CSV
+    marks = [""] * len(costs)
+    if csv_data is None:
+        return marks
+    expected = expected_costs(csv_data)
+    checked = min(len(costs), len(expected))
+    diff = np.abs(np.sqrt(np.asarray(costs[:checked], dtype=np.float64)) - expected[:checked])
+    for position in range(checked):
+        if diff[position] < tolerance:
+            marks[position] = f"✓ (CSV: {expected[position]:.2f})"
+        else:
+            marks[position] = f"❌ (CSV: {expected[position]:.2f}, diff: {diff[position]:.2f})"
+    return marks